@@ -8,6 +8,7 @@ urlpatterns = [
     path('status/<int:task_id>/', views.HDRStatusView.as_view(), name='status'),
     path('result/<int:task_id>/', views.HDRResultView.as_view(), name='result'),
     path('cancel/<int:task_id>/', views.HDRCancelView.as_view(), name='cancel'),
+    path('accept-preview/<int:task_id>/', views.HDRAcceptPreviewView.as_view(), name='accept_preview'),
     path('upload/', views.HDRUploadView.as_view(), name='upload'),
     path('history/', views.HDRHistoryView.as_view(), name='history'),
     path('profile/', views.UserProfileView.as_view(), name='profile'),
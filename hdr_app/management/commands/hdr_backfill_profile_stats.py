@@ -0,0 +1,53 @@
+# hdr_app/management/commands/hdr_backfill_profile_stats.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from hdr_app.models import HDREnhancementTask, UserProfile
+
+
+def finished_count(status):
+    """Correlated subquery counting a profile owner's tasks in a final status"""
+    return Coalesce(
+        Subquery(
+            HDREnhancementTask.objects.filter(user_id=OuterRef('user_id'), status=status)
+            .order_by().values('user_id').annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserProfile task statistics from hdr_enhancement_tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Profiles written per UPDATE batch')
+
+    def handle(self, *args, **options):
+        # Make sure every user with tasks has a profile to hold the counters
+        missing = User.objects.filter(
+            id__in=HDREnhancementTask.objects.values('user_id'), hdr_profile__isnull=True
+        )
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user) for user in missing],
+            ignore_conflicts=True,
+        )
+
+        # Counts are computed inside each UPDATE, so an increment committed
+        # by a worker meanwhile is never overwritten with a stale rollup
+        profile_ids = list(UserProfile.objects.order_by('id').values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(profile_ids), batch_size):
+            UserProfile.objects.filter(id__in=profile_ids[start:start + batch_size]).update(
+                total_successful=finished_count('completed'),
+                total_failed=finished_count('failed'),
+                total_processed=finished_count('completed') + finished_count('failed'),
+            )
+
+        finished = HDREnhancementTask.objects.filter(status__in=['completed', 'failed']).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled statistics for {len(profile_ids)} profiles "
+            f"from {finished} finished tasks"
+        ))
@@ -0,0 +1,322 @@
+# hdr_app/management/commands/hdr_loadtest.py
+import importlib.util
+import io
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from hdr_app.models import HDREnhancementTask, UserProfile
+
+SCENARIOS = ['upload_burst', 'dashboard_polling', 'history_browsing', 'downloads']
+
+USER_PASSWORD = 'loadtest-password'
+
+# Collapse ids in URLs so requests are reported per endpoint
+_ID_PATTERN = re.compile(r'/\d+/')
+
+
+# Same worker model as the production server in entrypoint.sh
+GUNICORN_ARGS = [
+    '--worker-class', 'sync',
+    '--timeout', '300',
+    '--max-requests', '1000',
+    '--max-requests-jitter', '100',
+    '--preload',
+    '--log-level', 'warning',
+]
+
+# Seconds to wait for the server to accept requests
+SERVER_START_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def make_image_bytes(size, image_format='PNG'):
+    """Random noise image of size x size pixels, encoded in memory"""
+    image = Image.effect_noise((size, size), 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class LoadTestClient:
+    """One simulated browser session against the test server"""
+
+    def __init__(self, base_url, username, task_ids, upload_bytes, recorder, think_time):
+        self.base_url = base_url
+        self.username = username
+        self.task_ids = task_ids
+        self.upload_bytes = upload_bytes
+        self.recorder = recorder
+        self.think_time = think_time
+        self.session = requests.Session()
+        # Last ETag seen per URL, revalidated like a browser cache would
+        self.etags = {}
+
+    def request(self, method, path, **kwargs):
+        if method == 'GET' and path in self.etags:
+            kwargs.setdefault('headers', {})['If-None-Match'] = self.etags[path]
+        started_at = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(method, path, time.perf_counter() - started_at, None, None)
+            return None
+        elapsed = time.perf_counter() - started_at
+        if method == 'GET' and 'ETag' in response.headers:
+            self.etags[path] = response.headers['ETag']
+        queries = response.headers.get('X-DB-Queries')
+        self.recorder.record(method, path, elapsed, response.status_code,
+                             int(queries) if queries is not None else None)
+        return response
+
+    def login(self):
+        self.session.get(self.base_url + '/accounts/login/', timeout=60)
+        response = self.session.post(self.base_url + '/accounts/login/', data={
+            'username': self.username,
+            'password': USER_PASSWORD,
+            'next': '/dashboard/',
+            'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', ''),
+        }, timeout=60)
+        if 'sessionid' not in self.session.cookies:
+            raise CommandError(f"Login failed for {self.username} (HTTP {response.status_code})")
+
+    def pause(self):
+        if self.think_time:
+            time.sleep(self.think_time)
+
+    def upload_burst(self):
+        for _ in range(3):
+            self.request('POST', '/api/upload/',
+                         files={'image': ('loadtest.png', self.upload_bytes, 'image/png')},
+                         headers={'X-CSRFToken': self.session.cookies.get('csrftoken', '')})
+
+    def dashboard_polling(self):
+        self.request('GET', '/dashboard/')
+        task_id = random.choice(self.task_ids)
+        for _ in range(5):
+            self.request('GET', '/api/history/')
+            self.request('GET', f'/api/status/{task_id}/')
+            self.pause()
+
+    def history_browsing(self):
+        self.request('GET', '/api/history/')
+        self.pause()
+        self.request('GET', '/profile/')
+        self.request('GET', '/api/profile/')
+        self.pause()
+        for task_id in random.sample(self.task_ids, min(3, len(self.task_ids))):
+            self.request('GET', f'/api/status/{task_id}/')
+
+    def downloads(self):
+        for task_id in random.sample(self.task_ids, min(2, len(self.task_ids))):
+            self.request('GET', f'/api/result/{task_id}/')
+            self.pause()
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint request measurements"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.not_modified = defaultdict(int)
+
+    def record(self, method, path, elapsed, status_code, queries):
+        endpoint = f"{method} {_ID_PATTERN.sub('/<id>/', path)}"
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+            if status_code is None or status_code >= 400:
+                self.errors[endpoint] += 1
+            elif status_code == 304:
+                self.not_modified[endpoint] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Offline HTTP load test of the web tier, served by gunicorn in a '
+        'subprocess. Run with --settings=hdr_project.settings_loadtest (SQLite, '
+        'in-process broker, file cache, local users); set LOADTEST_DATABASE_URL / '
+        'LOADTEST_BROKER_URL / LOADTEST_CACHE_URL to use a local Postgres or Redis instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20,
+                            help='Number of concurrent simulated users')
+        parser.add_argument('--duration', type=float, default=30.0,
+                            help='Seconds to run the scenarios for')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='Scenario to run (repeatable, default: all)')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Seconds each client pauses between steps')
+        parser.add_argument('--tasks-per-user', type=int, default=50,
+                            help='Completed tasks seeded for each user')
+        parser.add_argument('--image-size', type=int, default=512,
+                            help='Edge length in pixels of uploaded and result images')
+        parser.add_argument('--workers', type=int, default=3,
+                            help='Gunicorn worker processes serving the app')
+        parser.add_argument('--port', type=int, default=0,
+                            help='Port for the test server (0 picks a free one)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed for reproducible scenario choices')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'HDR_LOADTEST', False):
+            raise CommandError('Refusing to run outside --settings=hdr_project.settings_loadtest')
+        if importlib.util.find_spec('gunicorn') is None:
+            raise CommandError('gunicorn is required to serve the app under test')
+
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        scenarios = options['scenario'] or SCENARIOS
+
+        call_command('migrate', run_syncdb=True, verbosity=0)
+        users = self.seed_data(options['clients'], options['tasks_per_user'], options['image_size'])
+
+        port = options['port'] or free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = self.start_server(port, options['workers'])
+
+        recorder = Recorder()
+        upload_bytes = make_image_bytes(options['image_size'])
+
+        def run_client(username, task_ids):
+            client = LoadTestClient(base_url, username, task_ids, upload_bytes,
+                                    recorder, options['think_time'])
+            client.login()
+            while time.monotonic() < deadline:
+                getattr(client, random.choice(scenarios))()
+
+        try:
+            self.wait_for_server(server, base_url)
+            self.stdout.write(f"Gunicorn listening on {base_url} with {options['workers']} workers")
+            started_at = time.monotonic()
+            deadline = started_at + options['duration']
+            with ThreadPoolExecutor(max_workers=len(users)) as executor:
+                futures = [executor.submit(run_client, username, task_ids)
+                           for username, task_ids in users.items()]
+                for future in futures:
+                    future.result()
+            elapsed = time.monotonic() - started_at
+        finally:
+            self.stop_server(server)
+
+        self.report(recorder, elapsed, options['clients'], scenarios)
+
+    def start_server(self, port, workers):
+        """
+        Serve the app from gunicorn in its own process, so the server does
+        not share the load generator's GIL
+        """
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'hdr_project.wsgi:application',
+             '--bind', f"127.0.0.1:{port}", '--workers', str(workers), *GUNICORN_ARGS],
+            env=env,
+            cwd=settings.BASE_DIR,
+        )
+
+    def wait_for_server(self, server, base_url):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Gunicorn exited with code {server.returncode}")
+            try:
+                requests.get(base_url + '/accounts/login/', timeout=5)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f"Gunicorn did not start within {SERVER_START_TIMEOUT}s")
+
+    def stop_server(self, server):
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+    def seed_data(self, clients, tasks_per_user, image_size):
+        """Create local users with completed tasks and result files"""
+        result_bytes = make_image_bytes(image_size, 'JPEG')
+        result_path = default_storage.save('results/loadtest_result.jpg', ContentFile(result_bytes))
+
+        users = {}
+        for index in range(clients):
+            username = f"loadtest_user_{index}"
+            user, created = User.objects.get_or_create(username=username)
+            if created:
+                user.set_password(USER_PASSWORD)
+                user.save()
+                UserProfile.objects.create(user=user, daily_limit=1_000_000, monthly_limit=1_000_000)
+                HDREnhancementTask.objects.bulk_create([
+                    HDREnhancementTask(
+                        user=user,
+                        original_filename=f"seed_{number}.jpg",
+                        file_path=result_path,
+                        result_path=result_path,
+                        status='completed',
+                        progress=100,
+                    )
+                    for number in range(tasks_per_user)
+                ])
+            users[username] = list(
+                HDREnhancementTask.objects.filter(user=user, status='completed')
+                .values_list('id', flat=True)
+            )
+        return users
+
+    def report(self, recorder, elapsed, clients, scenarios):
+        total = sum(len(latencies) for latencies in recorder.latencies.values())
+        self.stdout.write(
+            f"\n{clients} clients, {elapsed:.1f}s, scenarios: {', '.join(scenarios)}"
+        )
+        self.stdout.write(f"{total} requests, {total / elapsed:.1f} req/s overall\n")
+        self.stdout.write(
+            f"{'Endpoint':<32} {'Count':>7} {'Errors':>7} {'304s':>7} {'Req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Avg DB':>7} {'Max DB':>7}"
+        )
+        for endpoint in sorted(recorder.latencies):
+            latencies = sorted(recorder.latencies[endpoint])
+            queries = recorder.queries[endpoint]
+            avg_queries = sum(queries) / len(queries) if queries else 0
+            self.stdout.write(
+                f"{endpoint:<32} {len(latencies):>7} {recorder.errors[endpoint]:>7} "
+                f"{recorder.not_modified[endpoint]:>7} "
+                f"{len(latencies) / elapsed:>8.1f} "
+                f"{percentile(latencies, 0.50) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.95) * 1000:>8.1f} "
+                f"{percentile(latencies, 0.99) * 1000:>8.1f} "
+                f"{avg_queries:>7.1f} {max(queries, default=0):>7}"
+            )
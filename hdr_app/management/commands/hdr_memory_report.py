@@ -0,0 +1,67 @@
+# hdr_app/management/commands/hdr_memory_report.py
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, ExpressionWrapper, F, Max, BigIntegerField
+from django.utils import timezone
+from hdr_app.models import HDREnhancementTask
+
+# Image size buckets in megapixels: (label, lower bound, upper bound)
+SIZE_BUCKETS = [
+    ('< 1 MP', 0, 1),
+    ('1-4 MP', 1, 4),
+    ('4-12 MP', 4, 12),
+    ('12-24 MP', 12, 24),
+    ('24-50 MP', 24, 50),
+    ('>= 50 MP', 50, None),
+]
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = 'Report worker memory usage per task grouped by input image size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Only include tasks created in the last N days')
+        parser.add_argument('--mode', choices=['diffhdr', 'fast'],
+                            help='Only include tasks of this enhancement mode')
+
+    def handle(self, *args, **options):
+        tasks = HDREnhancementTask.objects.filter(
+            peak_rss_bytes__isnull=False,
+            image_width__isnull=False,
+            image_height__isnull=False,
+            created_at__gte=timezone.now() - timedelta(days=options['days']),
+        ).annotate(
+            pixels=ExpressionWrapper(F('image_width') * F('image_height'),
+                                     output_field=BigIntegerField()),
+        )
+        if options['mode']:
+            tasks = tasks.filter(enhancement_mode=options['mode'])
+
+        self.stdout.write(
+            f"{'Size':<10} {'Tasks':>6} {'Avg peak MB':>12} {'Max peak MB':>12} "
+            f"{'Avg growth MB':>14} {'Avg tensor MB':>14}"
+        )
+
+        for label, lower, upper in SIZE_BUCKETS:
+            bucket = tasks.filter(pixels__gte=lower * 1_000_000)
+            if upper is not None:
+                bucket = bucket.filter(pixels__lt=upper * 1_000_000)
+
+            stats = bucket.aggregate(
+                count=Count('id'),
+                avg_peak=Avg('peak_rss_bytes'),
+                max_peak=Max('peak_rss_bytes'),
+                avg_growth=Avg('rss_growth_bytes'),
+                avg_tensor=Avg('tensor_bytes'),
+            )
+            if not stats['count']:
+                continue
+
+            self.stdout.write(
+                f"{label:<10} {stats['count']:>6} {stats['avg_peak'] / MB:>12.1f} "
+                f"{stats['max_peak'] / MB:>12.1f} {(stats['avg_growth'] or 0) / MB:>14.1f} "
+                f"{(stats['avg_tensor'] or 0) / MB:>14.1f}"
+            )
@@ -0,0 +1,89 @@
+# hdr_app/management/commands/hdr_model_registry.py
+import os
+import shutil
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from hdr_app.registry import file_checksum, read_manifest, write_manifest
+
+
+class Command(BaseCommand):
+    help = 'Manage DiffHDR model weight versions under HDR_MODEL_PATH'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        subparsers.add_parser('list', help='Show registered versions')
+
+        register = subparsers.add_parser('register', help='Add a weights file as a new version')
+        register.add_argument('name')
+        register.add_argument('weights', help='Path to the .pth weights file')
+        register.add_argument('--activate', action='store_true',
+                              help='Make the new version active immediately')
+
+        activate = subparsers.add_parser('activate', help='Switch all traffic to a version')
+        activate.add_argument('name')
+
+        candidate = subparsers.add_parser('candidate', help='Route a share of tasks to a version')
+        candidate.add_argument('name')
+        candidate.add_argument('--percent', type=int, required=True,
+                               help='Percentage of tasks routed to the candidate (0 disables)')
+
+    def handle(self, *args, **options):
+        manifest = read_manifest()
+        action = options['action']
+
+        if action == 'list':
+            for name, entry in sorted(manifest['versions'].items()):
+                marks = []
+                if name == manifest['active']:
+                    marks.append('active')
+                if name == manifest.get('candidate'):
+                    marks.append(f"candidate {manifest.get('candidate_percent', 0)}%")
+                self.stdout.write(f"{name:<20} {entry['file']:<40} {entry.get('sha256') or '-':<64} "
+                                  f"{', '.join(marks)}")
+            return
+
+        name = options['name']
+
+        if action == 'register':
+            if name in manifest['versions']:
+                raise CommandError(f"Version {name} is already registered")
+            source = os.path.abspath(options['weights'])
+            if not os.path.exists(source):
+                raise CommandError(f"Weights file not found: {source}")
+
+            # Keep every version's weights inside HDR_MODEL_PATH
+            model_dir = os.path.abspath(settings.HDR_MODEL_PATH)
+            if os.path.dirname(source) != model_dir:
+                target = os.path.join(model_dir, f"diffhdr_{name}.pth")
+                shutil.copyfile(source, target)
+                source = target
+
+            manifest['versions'][name] = {
+                'file': os.path.basename(source),
+                'sha256': file_checksum(source),
+            }
+            if options['activate']:
+                manifest['active'] = name
+
+        elif action in ('activate', 'candidate'):
+            if name not in manifest['versions']:
+                raise CommandError(f"Unknown version: {name}")
+            if action == 'activate':
+                manifest['active'] = name
+                if manifest.get('candidate') == name:
+                    manifest.pop('candidate')
+                    manifest.pop('candidate_percent', None)
+            elif options['percent'] > 0:
+                if not 0 < options['percent'] <= 100:
+                    raise CommandError('Percent must be between 0 and 100')
+                manifest['candidate'] = name
+                manifest['candidate_percent'] = options['percent']
+            else:
+                manifest.pop('candidate', None)
+                manifest.pop('candidate_percent', None)
+
+        write_manifest(manifest)
+        self.stdout.write(self.style.SUCCESS(
+            f"Registry updated: active={manifest['active']} candidate={manifest.get('candidate')}"
+        ))
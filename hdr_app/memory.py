@@ -0,0 +1,104 @@
+# hdr_app/memory.py
+import ctypes
+import ctypes.util
+import gc
+import logging
+import resource
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = resource.getpagesize()
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+    _malloc_trim = _libc.malloc_trim
+except (OSError, AttributeError):
+    # Not glibc (e.g. musl or macOS): nothing to trim
+    _malloc_trim = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return peak_rss()
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter so the next task gets its own peak"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def release_memory():
+    """Return freed buffers to the OS between tasks"""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+class MemoryTracker:
+    """Per-task peak RSS and tensor allocation accounting"""
+
+    def __init__(self, device=None):
+        self.device = device
+        self.start_rss = 0
+        self.peak_rss = None
+        self.rss_growth = None
+        self.tensor_bytes = 0
+
+    def start(self):
+        release_memory()
+        if not reset_peak_rss():
+            logger.debug("Peak RSS cannot be reset, per-task peak includes earlier tasks")
+        if self.device is not None and self.device.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self.start_rss = current_rss()
+        return self
+
+    def track(self, *buffers):
+        """Account for large arrays or tensors allocated by the task"""
+        for buffer in buffers:
+            if isinstance(buffer, torch.Tensor):
+                self.tensor_bytes += buffer.numel() * buffer.element_size()
+            elif isinstance(buffer, np.ndarray):
+                self.tensor_bytes += buffer.nbytes
+
+    def stop(self):
+        # Growth is measured after releasing freed buffers, so it reflects
+        # memory the task actually left behind in the worker
+        self.peak_rss = peak_rss()
+        release_memory()
+        self.rss_growth = current_rss() - self.start_rss
+        if self.device is not None and self.device.type == 'cuda':
+            self.tensor_bytes = max(self.tensor_bytes, torch.cuda.max_memory_allocated(self.device))
+        return self
+
+    def record(self, task):
+        """Copy the measurements onto an HDREnhancementTask (not saved)"""
+        task.peak_rss_bytes = self.peak_rss
+        task.rss_growth_bytes = self.rss_growth
+        task.tensor_bytes = self.tensor_bytes
@@ -1,4 +1,6 @@
 # hdr_app/middleware.py
+from django.db import connection
+
 class CSPMiddleware:
     """Custom Content Security Policy middleware for Alpine.js compatibility"""
     
@@ -21,4 +23,24 @@ class CSPMiddleware:
         )
         
         response['Content-Security-Policy'] = csp_policy
-        return response
\ No newline at end of file
+        return response
+
+class QueryCountMiddleware:
+    """Report the number of database queries per request for load testing"""
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_count = 0
+        
+        def count_queries(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+        
+        with connection.execute_wrapper(count_queries):
+            response = self.get_response(request)
+        
+        response['X-DB-Queries'] = str(query_count)
+        return response
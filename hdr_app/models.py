@@ -1,7 +1,22 @@
 # hdr_app/models.py
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .versioning import bump_tasks_version
+
+ENHANCEMENT_MODE_CHOICES = [
+    ('diffhdr', 'DiffHDR'),
+    ('fast', 'Fast (tone mapping / exposure fusion)'),
+]
+
+TONE_MAP_OPERATOR_CHOICES = [
+    ('reinhard', 'Reinhard'),
+    ('mantiuk', 'Mantiuk'),
+    ('drago', 'Drago'),
+]
 
 class HDREnhancementTask(models.Model):
     STATUS_CHOICES = [
@@ -16,6 +31,17 @@ class HDREnhancementTask(models.Model):
     original_filename = models.CharField(max_length=255)
     file_path = models.CharField(max_length=500)  # Path to uploaded file
     result_path = models.CharField(max_length=500, blank=True, null=True)  # Path to result file
+    preview_path = models.CharField(max_length=500, blank=True, null=True)  # Path to low-resolution preview
+    preview_accepted = models.BooleanField(default=False)  # User kept the preview as the final result
+    bracket_paths = models.JSONField(default=list, blank=True)  # Extra exposures for bracketed uploads
+    
+    # Enhancement options
+    enhancement_mode = models.CharField(max_length=10, choices=ENHANCEMENT_MODE_CHOICES, default='diffhdr')
+    tone_map_operator = models.CharField(max_length=10, choices=TONE_MAP_OPERATOR_CHOICES, default='reinhard')
+    sampling_steps = models.IntegerField(null=True, blank=True)  # Requested diffusion steps, default schedule if empty
+    latency_budget = models.FloatField(null=True, blank=True)  # Sampling time budget in seconds
+    steps_used = models.IntegerField(null=True, blank=True)  # Diffusion steps actually run
+    model_version = models.CharField(max_length=50, blank=True, null=True)  # Registry version that produced the result
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     progress = models.IntegerField(default=0)  # Progress percentage 0-100
@@ -31,6 +57,19 @@ class HDREnhancementTask(models.Model):
     file_size_original = models.BigIntegerField(null=True, blank=True)  # in bytes
     file_size_result = models.BigIntegerField(null=True, blank=True)  # in bytes
     
+    # Image metadata from the upload pre-flight header inspection
+    image_format = models.CharField(max_length=10, blank=True, null=True)  # JPEG, PNG or TIFF
+    image_width = models.IntegerField(null=True, blank=True)  # in pixels
+    image_height = models.IntegerField(null=True, blank=True)  # in pixels
+    bit_depth = models.IntegerField(null=True, blank=True)  # bits per channel
+    exif_orientation = models.IntegerField(default=1)  # EXIF orientation tag, 1 = upright
+    frame_count = models.IntegerField(default=1)
+    
+    # Worker memory accounting
+    peak_rss_bytes = models.BigIntegerField(null=True, blank=True)  # Peak worker RSS during the task
+    rss_growth_bytes = models.BigIntegerField(null=True, blank=True)  # RSS retained after the task
+    tensor_bytes = models.BigIntegerField(null=True, blank=True)  # Large array/tensor allocations
+    
     class Meta:
         db_table = 'hdr_enhancement_tasks'
         ordering = ['-created_at']
@@ -38,6 +77,35 @@ class HDREnhancementTask(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.original_filename} ({self.status})"
     
+    @classmethod
+    def start(cls, task_id, user_id):
+        """
+        Move a pending task to processing with one conditional UPDATE.
+        Returns False if the task was cancelled or picked up meanwhile.
+        """
+        updated = cls.objects.filter(id=task_id, status='pending').update(
+            status='processing', progress=10, updated_at=timezone.now()
+        )
+        if updated:
+            bump_tasks_version(user_id)
+        return bool(updated)
+    
+    @classmethod
+    def finish(cls, task_id, user_id, status, **fields):
+        """
+        Move a pending/processing task to a final status with one conditional
+        UPDATE. Returns True only for the caller that made the transition, so
+        a task finished concurrently (e.g. preview accepted while the worker
+        completes) is written and counted once.
+        """
+        updated = cls.objects.filter(
+            id=task_id, status__in=['pending', 'processing']
+        ).update(status=status, updated_at=timezone.now(), **fields)
+        if updated:
+            # update() sends no post_save, so invalidate the ETags here
+            bump_tasks_version(user_id)
+        return bool(updated)
+    
     @property
     def is_completed(self):
         return self.status == 'completed'
@@ -49,6 +117,20 @@ class HDREnhancementTask(models.Model):
     @property
     def has_result(self):
         return self.status == 'completed' and self.result_path
+    
+    @property
+    def has_preview(self):
+        return bool(self.preview_path)
+    
+    @property
+    def megapixels(self):
+        if not self.image_width or not self.image_height:
+            return None
+        return self.image_width * self.image_height / 1_000_000
+    
+    @property
+    def is_bracketed(self):
+        return bool(self.bracket_paths)
 
 class UserProfile(models.Model):
     """Extended user profile for HDR enhancement service"""
@@ -74,6 +156,16 @@ class UserProfile(models.Model):
         default='jpeg'
     )
     preferred_quality = models.IntegerField(default=95)  # For JPEG output
+    preferred_enhancement_mode = models.CharField(
+        max_length=10,
+        choices=ENHANCEMENT_MODE_CHOICES,
+        default='diffhdr'
+    )
+    preferred_tone_map_operator = models.CharField(
+        max_length=10,
+        choices=TONE_MAP_OPERATOR_CHOICES,
+        default='reinhard'
+    )
     
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -103,4 +195,25 @@ class UserProfile(models.Model):
     
     def can_process_more(self):
         """Check if user can process more images today"""
-        return self.get_daily_usage() < self.daily_limit
\ No newline at end of file
+        return self.get_daily_usage() < self.daily_limit
+    
+    @classmethod
+    def record_outcome(cls, user_id, succeeded):
+        """
+        Count a finished task in the user's statistics with a single atomic
+        UPDATE, so concurrent workers never read-modify-write the profile row
+        """
+        counters = {'total_processed': F('total_processed') + 1}
+        if succeeded:
+            counters['total_successful'] = F('total_successful') + 1
+        else:
+            counters['total_failed'] = F('total_failed') + 1
+        
+        if not cls.objects.filter(user_id=user_id).update(**counters):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**counters)
+
+@receiver([post_save, post_delete], sender=HDREnhancementTask)
+def bump_user_tasks_version(sender, instance, **kwargs):
+    """Invalidate the owner's status/history ETags on any task change"""
+    bump_tasks_version(instance.user_id)
\ No newline at end of file
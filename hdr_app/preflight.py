@@ -0,0 +1,107 @@
+# hdr_app/preflight.py
+import warnings
+from PIL import Image, UnidentifiedImageError
+from django.conf import settings
+
+ALLOWED_FORMATS = ['JPEG', 'PNG', 'TIFF']
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+# EXIF orientations that turn the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# TIFF tag holding the bits per sample of each channel
+TIFF_BITS_PER_SAMPLE = 258
+
+# Offset of the bit depth byte in a PNG file: 8-byte signature, IHDR chunk
+# length and type, then 4-byte width and height
+PNG_BIT_DEPTH_OFFSET = 24
+
+
+class PreflightError(ValueError):
+    """Raised when an upload fails the header inspection"""
+
+
+def _check_size(width, height):
+    if max(width, height) > settings.HDR_MAX_IMAGE_DIMENSION:
+        raise PreflightError(
+            f"Image is too large: {width}x{height} "
+            f"(max {settings.HDR_MAX_IMAGE_DIMENSION}px per side)"
+        )
+
+    if width * height > settings.HDR_MAX_IMAGE_PIXELS:
+        raise PreflightError(
+            f"Image is too large: {width * height / 1_000_000:.1f} MP "
+            f"(max {settings.HDR_MAX_IMAGE_PIXELS / 1_000_000:.0f} MP)"
+        )
+
+
+def _bit_depth(image, header):
+    """Bits per channel as stored in the file header"""
+    if image.format == 'TIFF':
+        bits = image.tag_v2.get(TIFF_BITS_PER_SAMPLE, 1)
+        return max(bits) if isinstance(bits, tuple) else bits
+    if image.format == 'PNG' and header[12:16] == b'IHDR':
+        return header[PNG_BIT_DEPTH_OFFSET]
+    # JPEG: sample precision from the SOF marker
+    return getattr(image, 'bits', None) or 8
+
+
+def _exif_orientation(image):
+    """
+    EXIF orientation from data already parsed with the header. Never use
+    getexif(), which makes PNG decode the whole image to find an eXIf chunk.
+    """
+    if image.format == 'TIFF':
+        return image.tag_v2.get(EXIF_ORIENTATION, 1)
+    exif_data = image.info.get('exif')
+    if not exif_data:
+        return 1
+    exif = Image.Exif()
+    exif.load(exif_data)
+    return exif.get(EXIF_ORIENTATION, 1)
+
+
+def display_size(metadata):
+    """(width, height) of an inspected image once its EXIF orientation is applied"""
+    if metadata['exif_orientation'] in TRANSPOSED_ORIENTATIONS:
+        return metadata['image_height'], metadata['image_width']
+    return metadata['image_width'], metadata['image_height']
+
+
+def inspect_image(image_file):
+    """
+    Read only the image header to get the real format, dimensions, bit
+    depth, EXIF orientation and frame count, without decoding any pixels.
+
+    Raises PreflightError for unreadable, disguised or oversized images.
+    """
+    try:
+        header = image_file.read(PNG_BIT_DEPTH_OFFSET + 1)
+        image_file.seek(0)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(image_file) as image:
+                if image.format not in ALLOWED_FORMATS:
+                    raise PreflightError('Invalid file type. Only JPEG, PNG, and TIFF are allowed.')
+
+                # Reject oversized images before reading any further metadata
+                _check_size(image.width, image.height)
+
+                metadata = {
+                    'image_format': image.format,
+                    'image_width': image.width,
+                    'image_height': image.height,
+                    'bit_depth': _bit_depth(image, header),
+                    'exif_orientation': _exif_orientation(image),
+                    'frame_count': getattr(image, 'n_frames', 1),
+                }
+    except Image.DecompressionBombError:
+        raise PreflightError('Image dimensions are too large')
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise PreflightError('File is not a valid image')
+    finally:
+        image_file.seek(0)
+
+    return metadata
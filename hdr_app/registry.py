@@ -0,0 +1,209 @@
+# hdr_app/registry.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'registry.json'
+
+# Version used when HDR_MODEL_PATH has no registry manifest
+DEFAULT_VERSION = 'default'
+
+
+class RegistryError(Exception):
+    """Raised for missing versions or weight files failing their checksum"""
+
+
+def manifest_path():
+    return os.path.join(settings.HDR_MODEL_PATH, MANIFEST_NAME)
+
+
+def file_checksum(path):
+    """SHA-256 of a weights file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as weights:
+        for chunk in iter(lambda: weights.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest():
+    """
+    Load the registry manifest:
+
+        {"active": "v2", "candidate": "v3", "candidate_percent": 10,
+         "versions": {"v2": {"file": "diffhdr_v2.pth", "sha256": "..."}}}
+
+    Without a manifest, HDR_MODEL_WEIGHTS is served as the only version.
+    """
+    try:
+        with open(manifest_path()) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {
+            'active': DEFAULT_VERSION,
+            'versions': {
+                DEFAULT_VERSION: {'file': settings.HDR_MODEL_WEIGHTS, 'sha256': None},
+            },
+        }
+
+
+def write_manifest(manifest):
+    """Atomically replace the manifest so workers never read a partial file"""
+    path = manifest_path()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as temp:
+        json.dump(manifest, temp, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def route_version(manifest, task_id):
+    """
+    Pick the version for a task: a stable candidate_percent share of task
+    ids goes to the candidate, everything else to the active version
+    """
+    candidate = manifest.get('candidate')
+    percent = manifest.get('candidate_percent', 0)
+    if candidate and percent > 0:
+        if zlib.crc32(str(task_id).encode()) % 100 < percent:
+            return candidate
+    return manifest['active']
+
+
+class ModelRegistry:
+    """
+    Per-worker cache of loaded model versions.
+
+    New active or candidate versions are loaded in a background thread;
+    tasks keep using the previous active version until the new one is
+    ready, so a rollout never blocks or restarts the worker. A candidate
+    only ever runs the tasks routed to it.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.models = {}
+        self.loading = set()
+        self.failed = set()
+        # Last active version that was loaded, the fallback for every task
+        # whose routed version is not ready
+        self.serving = None
+        self.manifest = None
+        self.manifest_mtime = None
+        self.device = None
+
+    def refresh(self):
+        """Re-read the manifest if it changed since the last task"""
+        try:
+            mtime = os.stat(manifest_path()).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if self.manifest is not None and mtime == self.manifest_mtime:
+            return
+        self.manifest = read_manifest()
+        self.manifest_mtime = mtime
+        # A new manifest may fix versions that failed to load
+        self.failed.clear()
+        logger.info(f"Model registry: active={self.manifest['active']} "
+                    f"candidate={self.manifest.get('candidate')}")
+
+    def acquire(self, task_id, device):
+        """Return (model, version) to run a task with"""
+        self.device = device
+        self.refresh()
+        active = self.manifest['active']
+        wanted = route_version(self.manifest, task_id)
+
+        with self.lock:
+            live = {active, self.manifest.get('candidate')} - {None}
+            if active in self.models:
+                self.serving = active
+                # Evict versions no longer referenced by the manifest, but only
+                # once the new active version is loaded and can take over
+                for version in list(self.models):
+                    if version not in live:
+                        logger.info(f"Unloading model version {version}")
+                        del self.models[version]
+
+            # Without a loaded active version to fall back on, the worker is
+            # cold and loads what this task needs synchronously
+            cold = self.serving not in self.models
+            for version in live:
+                if version in self.models or version in self.loading or version in self.failed:
+                    continue
+                if cold and version in (wanted, active):
+                    continue
+                self.preload(version)
+
+            if wanted in self.models:
+                return self.models[wanted], wanted
+            if not cold:
+                # Keep serving the last loaded active version, never the
+                # candidate, while the routed version warms up
+                return self.models[self.serving], self.serving
+
+        # Cold worker: load the active version first, so a broken candidate
+        # never leaves the task without a validated model to run on
+        model = self.load_now(active)
+        if wanted == active:
+            return model, active
+        try:
+            return self.load_now(wanted), wanted
+        except Exception as e:
+            logger.error(f"Failed to load model version {wanted}: {str(e)}")
+            with self.lock:
+                self.failed.add(wanted)
+            return model, active
+
+    def load_now(self, version):
+        """Load a version synchronously in the calling thread"""
+        with self.lock:
+            self.loading.add(version)
+        try:
+            model = self.load(version)
+        finally:
+            with self.lock:
+                self.loading.discard(version)
+        with self.lock:
+            self.models[version] = model
+            if version == self.manifest['active']:
+                self.serving = version
+        return model
+
+    def preload(self, version):
+        """Load a version in the background; caller holds the lock"""
+        self.loading.add(version)
+
+        def run():
+            try:
+                model = self.load(version)
+                with self.lock:
+                    self.models[version] = model
+                logger.info(f"Model version {version} ready")
+            except Exception as e:
+                logger.error(f"Failed to preload model version {version}: {str(e)}")
+                with self.lock:
+                    self.failed.add(version)
+            finally:
+                with self.lock:
+                    self.loading.discard(version)
+
+        threading.Thread(target=run, name=f"preload-{version}", daemon=True).start()
+
+    def load(self, version):
+        entry = self.manifest['versions'].get(version)
+        if entry is None:
+            raise RegistryError(f"Unknown model version: {version}")
+
+        weights_path = os.path.join(settings.HDR_MODEL_PATH, entry['file'])
+        if entry.get('sha256') and file_checksum(weights_path) != entry['sha256']:
+            raise RegistryError(f"Checksum mismatch for model version {version}")
+
+        logger.info(f"Loading model version {version} from {weights_path}")
+        return self.loader(self.device, weights_path)
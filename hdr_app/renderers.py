@@ -0,0 +1,44 @@
+# hdr_app/renderers.py
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(payload):
+    """Serialize plain dicts/lists from .values() rows to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_UTC_Z)
+    return json.dumps(payload, cls=DjangoJSONEncoder).encode()
+
+
+def etag_matches(request, etag):
+    """Check the request's If-None-Match header against a strong ETag"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def _add_validators(response, etag):
+    response['ETag'] = etag
+    # Browsers keep the payload but revalidate on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    return _add_validators(HttpResponseNotModified(), etag)
+
+
+def json_response(payload, etag=None, status=200):
+    response = HttpResponse(dumps(payload), content_type='application/json', status=status)
+    if etag is not None:
+        _add_validators(response, etag)
+    return response
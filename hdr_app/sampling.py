@@ -0,0 +1,117 @@
+# hdr_app/sampling.py
+import inspect
+import logging
+import time
+import torch
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Measured seconds per diffusion step, keyed by device, for this worker process
+_step_costs = {}
+
+# Cached average shared between workers, so a fresh process can fit budgets
+# before it has timed a run of its own
+STEP_COST_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Weight of the newest measurement in the running per-step cost average
+STEP_COST_SMOOTHING = 0.3
+
+
+def ddim_timesteps(num_steps, num_train_steps=None):
+    """
+    DDIM-style skipped schedule: num_steps evenly spaced training
+    timesteps, from the noisiest down to zero
+    """
+    num_train_steps = num_train_steps or settings.HDR_DIFFUSION_TRAIN_STEPS
+    num_steps = max(1, min(num_steps, num_train_steps))
+    stride = num_train_steps / num_steps
+    return [int(round(i * stride)) for i in reversed(range(num_steps))]
+
+
+def step_cost_key(device):
+    return f"hdr_step_cost:{device.type}"
+
+
+def estimate_step_cost(device):
+    """
+    Average seconds per step: measured on this worker, else shared by other
+    workers through the cache, else HDR_DIFFUSION_STEP_COST. None if unknown.
+    """
+    cost = _step_costs.get(str(device))
+    if cost is None:
+        cost = cache.get(step_cost_key(device))
+    if cost is None:
+        cost = settings.HDR_DIFFUSION_STEP_COST or None
+    return cost
+
+
+def record_step_cost(device, elapsed, steps):
+    """Fold a completed sampling run into the per-step cost average"""
+    if not steps or elapsed <= 0:
+        return
+    cost = elapsed / steps
+    previous = _step_costs.get(str(device))
+    if previous is None:
+        previous = cache.get(step_cost_key(device))
+    if previous is not None:
+        cost = previous + STEP_COST_SMOOTHING * (cost - previous)
+    _step_costs[str(device)] = cost
+    cache.set(step_cost_key(device), cost, STEP_COST_CACHE_TIMEOUT)
+
+
+def choose_num_steps(device, requested_steps=None, latency_budget=None):
+    """
+    Pick the number of sampling steps for a task, shrinking the requested
+    schedule to fit the latency budget at this worker's measured step cost
+    """
+    max_steps = requested_steps or settings.HDR_DIFFUSION_STEPS
+    min_steps = min(settings.HDR_DIFFUSION_MIN_STEPS, max_steps)
+
+    step_cost = estimate_step_cost(device)
+    if not latency_budget or step_cost is None:
+        return max_steps
+
+    affordable = int(latency_budget / step_cost)
+    return max(min_steps, min(max_steps, affordable))
+
+
+def _accepts_timesteps(func):
+    try:
+        return 'timesteps' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def run_diffusion(model, input_tensor, num_steps, device):
+    """
+    Run the model with a DDIM-style schedule of num_steps steps.
+
+    Models exposing a ``timesteps`` argument on ``sample`` or ``forward``
+    get the skipped schedule; anything else runs its built-in full
+    schedule. Returns the output and the number of steps actually used,
+    or None when the model's own schedule length is unknown.
+    """
+    timesteps = ddim_timesteps(num_steps)
+
+    started_at = time.monotonic()
+    sampler = getattr(model, 'sample', None)
+    if callable(sampler) and _accepts_timesteps(sampler):
+        output = sampler(input_tensor, timesteps=timesteps)
+        steps_used = len(timesteps)
+    elif _accepts_timesteps(model.forward):
+        output = model(input_tensor, timesteps=timesteps)
+        steps_used = len(timesteps)
+    else:
+        logger.warning("Model does not accept a step schedule, running its full schedule")
+        output = model(input_tensor)
+        # Unknown schedule length, so the run says nothing about step cost
+        steps_used = None
+
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    if steps_used is not None:
+        record_step_cost(device, time.monotonic() - started_at, steps_used)
+
+    return output, steps_used
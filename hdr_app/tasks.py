@@ -1,14 +1,22 @@
 # hdr_app/tasks.py
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import task_postrun
 import torch
 import torchvision.transforms as transforms
-from PIL import Image
+from PIL import Image, ImageOps
 import numpy as np
+import cv2
 import os
 import sys
+import time
 import logging
 from django.conf import settings
-from .models import HDREnhancementTask
+from .models import HDREnhancementTask, UserProfile
+from .tonemap import tone_map_image, fuse_exposures
+from .sampling import choose_num_steps, run_diffusion
+from .memory import MemoryTracker, release_memory
+from .registry import ModelRegistry
 
 # Add DiffHDR to path
 sys.path.append(os.path.join(settings.BASE_DIR, 'DiffHDR-pytorch'))
@@ -19,24 +27,41 @@ logger = logging.getLogger(__name__)
 def process_hdr_enhancement(task_id):
     """
     Celery task to process HDR enhancement using DiffHDR model
+    or the fast tone mapping / exposure fusion path
     """
     try:
+        started_at = time.monotonic()
         task = HDREnhancementTask.objects.get(id=task_id)
+        if not HDREnhancementTask.start(task.id, task.user_id):
+            logger.info(f"Skipping task {task_id}: status is {task.status}")
+            return {'status': task.status, 'result_path': task.result_path}
         task.status = 'processing'
         task.progress = 10
-        task.save()
+        
+        if task.enhancement_mode == 'fast':
+            return process_fast_enhancement(task, started_at)
         
         # Load the model (you'll need to implement this based on DiffHDR structure)
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         logger.info(f"Using device: {device}")
+        memory = MemoryTracker(device).start()
         
         # Update progress
         task.progress = 30
-        task.save()
+        task.save(update_fields=['progress', 'updated_at'])
         
         # Load and preprocess image
         input_path = os.path.join(settings.MEDIA_ROOT, task.file_path)
-        image = Image.open(input_path).convert('RGB')
+        image = Image.open(input_path)
+        if task.exif_orientation != 1:
+            image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        if task.image_width is None:
+            # Uploaded before pre-flight inspection stored the dimensions
+            task.image_width, task.image_height = image.size
+        
+        # Publish a quick low-resolution result before the full model run
+        publish_preview(task, image)
         
         # Preprocessing transforms
         transform = transforms.Compose([
@@ -45,25 +70,40 @@ def process_hdr_enhancement(task_id):
         ])
         
         input_tensor = transform(image).unsqueeze(0).to(device)
+        memory.track(input_tensor)
         
         # Update progress
         task.progress = 50
-        task.save()
+        task.save(update_fields=['progress', 'updated_at'])
         
-        # Load DiffHDR model (implement based on actual model structure)
-        model = load_diffhdr_model(device)
+        # Get the DiffHDR model version routed to this task from the registry
+        model, model_version = model_registry.acquire(task_id, device)
+        task.model_version = model_version
         
         # Update progress
         task.progress = 70
-        task.save()
+        task.save(update_fields=['progress', 'model_version', 'updated_at'])
+        
+        # Stop early if the user accepted the preview or cancelled meanwhile
+        if is_superseded(task):
+            return {'status': task.status, 'result_path': task.result_path}
+        
+        # Fit the sampling schedule to the task's latency budget
+        num_steps = choose_num_steps(device, task.sampling_steps, task.latency_budget)
+        logger.info(f"Sampling task {task_id} with {num_steps} steps")
         
         # Process image
         with torch.inference_mode():
-            enhanced_tensor = model(input_tensor)
+            enhanced_tensor, steps_used = run_diffusion(model, input_tensor, num_steps, device)
+        memory.track(enhanced_tensor)
         
         # Update progress
         task.progress = 90
-        task.save()
+        task.steps_used = steps_used
+        task.save(update_fields=['progress', 'steps_used', 'updated_at'])
+        
+        if is_superseded(task):
+            return {'status': task.status, 'result_path': task.result_path}
         
         # Post-process and save result
         enhanced_image = tensor_to_pil(enhanced_tensor)
@@ -76,24 +116,150 @@ def process_hdr_enhancement(task_id):
         os.makedirs(os.path.dirname(full_result_path), exist_ok=True)
         enhanced_image.save(full_result_path, 'JPEG', quality=95)
         
+        # Drop large buffers before measuring what the task left behind
+        del model, image, input_tensor, enhanced_tensor, enhanced_image
+        memory.stop().record(task)
+        
         # Update task
-        task.result_path = result_path
-        task.status = 'completed'
-        task.progress = 100
-        task.save()
+        if not complete_task(task, result_path, started_at):
+            return {'status': task.status, 'result_path': task.result_path}
         
         logger.info(f"HDR enhancement completed for task {task_id}")
         return {'status': 'success', 'result_path': result_path}
         
     except Exception as e:
-        logger.error(f"HDR enhancement failed for task {task_id}: {str(e)}")
         task = HDREnhancementTask.objects.get(id=task_id)
-        task.status = 'failed'
-        task.error_message = str(e)
-        task.save()
+        if isinstance(e, SoftTimeLimitExceeded) and task.status != 'processing':
+            # Interrupted by interrupt_task() after the preview was accepted
+            # or the task cancelled; the pool process and its models live on
+            logger.info(f"Stopped task {task_id} mid-run: status is {task.status}")
+            return {'status': task.status, 'result_path': task.result_path}
+        logger.error(f"HDR enhancement failed for task {task_id}: {str(e)}")
+        # Leave tasks already completed from the preview or cancelled untouched
+        if HDREnhancementTask.finish(task.id, task.user_id, 'failed', error_message=str(e)):
+            UserProfile.record_outcome(task.user_id, succeeded=False)
         raise
 
-def load_diffhdr_model(device):
+def publish_preview(task, image):
+    """
+    Tone map a downscaled copy of the input and store it as the task preview
+    """
+    enhanced = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    
+    height, width = enhanced.shape[:2]
+    scale = settings.HDR_PREVIEW_MAX_SIZE / max(height, width)
+    if scale < 1:
+        enhanced = cv2.resize(enhanced, (round(width * scale), round(height * scale)),
+                              interpolation=cv2.INTER_AREA)
+    
+    enhanced = tone_map_image(enhanced, task.tone_map_operator)
+    
+    preview_path = f"results/preview_{task.id}_{task.original_filename}"
+    full_preview_path = os.path.join(settings.MEDIA_ROOT, preview_path)
+    
+    os.makedirs(os.path.dirname(full_preview_path), exist_ok=True)
+    Image.fromarray(cv2.cvtColor(enhanced, cv2.COLOR_BGR2RGB)).save(full_preview_path, 'JPEG', quality=85)
+    
+    task.preview_path = preview_path
+    task.progress = 40
+    task.save(update_fields=['preview_path', 'progress', 'updated_at'])
+    
+    logger.info(f"Preview published for task {task.id}")
+
+def is_superseded(task):
+    """
+    Check whether the task was finished from the preview or cancelled
+    while this worker was still refining it
+    """
+    task.refresh_from_db(fields=['status', 'result_path', 'preview_accepted'])
+    if task.status != 'processing':
+        logger.info(f"Stopping refinement for task {task.id}: status is {task.status}")
+        return True
+    return False
+
+def complete_task(task, result_path, started_at):
+    """
+    Record the result and mark the task completed, unless the user accepted
+    the preview or cancelled in the meantime. Returns True if this call
+    completed the task.
+    """
+    completed = HDREnhancementTask.finish(
+        task.id, task.user_id, 'completed',
+        result_path=result_path,
+        progress=100,
+        processing_time=time.monotonic() - started_at,
+        image_width=task.image_width,
+        image_height=task.image_height,
+        peak_rss_bytes=task.peak_rss_bytes,
+        rss_growth_bytes=task.rss_growth_bytes,
+        tensor_bytes=task.tensor_bytes,
+    )
+    if completed:
+        UserProfile.record_outcome(task.user_id, succeeded=True)
+    else:
+        task.refresh_from_db(fields=['status', 'result_path'])
+        logger.info(f"Discarding result for task {task.id}: status is {task.status}")
+    return completed
+
+def process_fast_enhancement(task, started_at):
+    """
+    Enhance with vectorized OpenCV tone mapping, or Mertens exposure
+    fusion for bracketed uploads, at full resolution on the CPU
+    """
+    memory = MemoryTracker().start()
+    
+    input_paths = [task.file_path] + list(task.bracket_paths)
+    images = []
+    for path in input_paths:
+        image = cv2.imread(os.path.join(settings.MEDIA_ROOT, path), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Unable to read image: {path}")
+        memory.track(image)
+        images.append(image)
+    if task.image_width is None:
+        task.image_height, task.image_width = images[0].shape[:2]
+    
+    task.progress = 50
+    task.save(update_fields=['progress', 'updated_at'])
+    
+    if len(images) > 1:
+        enhanced = fuse_exposures(images)
+    else:
+        enhanced = tone_map_image(images[0], task.tone_map_operator)
+    memory.track(enhanced)
+    
+    task.progress = 90
+    task.save(update_fields=['progress', 'updated_at'])
+    
+    # Save result
+    result_filename = f"enhanced_{task.id}_{task.original_filename}"
+    result_path = f"results/{result_filename}"
+    full_result_path = os.path.join(settings.MEDIA_ROOT, result_path)
+    
+    os.makedirs(os.path.dirname(full_result_path), exist_ok=True)
+    Image.fromarray(cv2.cvtColor(enhanced, cv2.COLOR_BGR2RGB)).save(full_result_path, 'JPEG', quality=95)
+    
+    # Drop large buffers before measuring what the task left behind
+    input_count = len(images)
+    del images, image, enhanced
+    memory.stop().record(task)
+    
+    # Update task
+    if not complete_task(task, result_path, started_at):
+        return {'status': task.status, 'result_path': task.result_path}
+    
+    logger.info(f"Fast HDR enhancement completed for task {task.id} ({input_count} input(s))")
+    return {'status': 'success', 'result_path': result_path}
+
+@task_postrun.connect
+def release_task_memory(**kwargs):
+    """
+    Trim the allocator after every task, including failed ones, so the
+    worker's RSS reflects live data when the memory recycle limit is checked
+    """
+    release_memory()
+
+def load_diffhdr_model(device, weights_path=None):
     """
     Load the DiffHDR model - implement based on actual model structure
     """
@@ -104,7 +270,7 @@ def load_diffhdr_model(device):
         model = DiffHDRNet()
         
         # Load pretrained weights if available
-        weights_path = settings.HDR_MODEL_WEIGHTS
+        weights_path = weights_path or settings.HDR_MODEL_WEIGHTS
         if os.path.exists(weights_path):
             model.load_state_dict(torch.load(weights_path, map_location=device))
         
@@ -116,6 +282,9 @@ def load_diffhdr_model(device):
         logger.error(f"Failed to load DiffHDR model: {str(e)}")
         raise
 
+# Loaded model versions are kept per worker process and swapped between tasks
+model_registry = ModelRegistry(load_diffhdr_model)
+
 def tensor_to_pil(tensor):
     """
     Convert PyTorch tensor to PIL Image
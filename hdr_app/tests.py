@@ -0,0 +1,151 @@
+# hdr_app/tests.py
+import os
+import shutil
+import tempfile
+import threading
+from django.test import SimpleTestCase, override_settings
+from .registry import ModelRegistry, route_version, write_manifest
+
+
+def make_manifest(active, candidate=None, percent=0, broken=()):
+    """Manifest with one weights file per version; broken versions fail their checksum"""
+    versions = {}
+    for version in {active, candidate} - {None}:
+        versions[version] = {'file': f"{version}.pth",
+                             'sha256': 'bad' if version in broken else None}
+    manifest = {'active': active, 'versions': versions}
+    if candidate:
+        manifest['candidate'] = candidate
+        manifest['candidate_percent'] = percent
+    return manifest
+
+
+def task_routed_to(manifest, version):
+    """First task id the manifest routes to version"""
+    return next(task_id for task_id in range(1, 10_000)
+                if route_version(manifest, task_id) == version)
+
+
+class StubLoader:
+    """Loader returning a named placeholder; blocked versions wait for release()"""
+
+    def __init__(self):
+        self.loaded = []
+        self.gates = {}
+
+    def block(self, version):
+        self.gates[version] = threading.Event()
+
+    def release(self, version):
+        self.gates.pop(version).set()
+
+    def __call__(self, device, weights_path):
+        version = os.path.splitext(os.path.basename(weights_path))[0]
+        gate = self.gates.get(version)
+        if gate is not None:
+            gate.wait(5)
+        self.loaded.append(version)
+        return f"model-{version}"
+
+
+def wait_for_preloads():
+    for thread in threading.enumerate():
+        if thread.name.startswith('preload-'):
+            thread.join(5)
+
+
+class RouteVersionTests(SimpleTestCase):
+    def test_without_candidate_routes_to_active(self):
+        manifest = make_manifest('v1')
+        self.assertEqual({route_version(manifest, task_id) for task_id in range(100)}, {'v1'})
+
+    def test_zero_percent_routes_to_active(self):
+        manifest = make_manifest('v1', 'v2', percent=0)
+        self.assertEqual({route_version(manifest, task_id) for task_id in range(100)}, {'v1'})
+
+    def test_candidate_share_is_stable(self):
+        manifest = make_manifest('v1', 'v2', percent=10)
+        routed = [route_version(manifest, task_id) for task_id in range(10_000)]
+        self.assertAlmostEqual(routed.count('v2') / len(routed), 0.10, delta=0.02)
+        self.assertEqual(routed, [route_version(manifest, task_id) for task_id in range(10_000)])
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.model_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_path)
+        settings_override = override_settings(HDR_MODEL_PATH=self.model_path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.loader = StubLoader()
+        self.registry = ModelRegistry(self.loader)
+        self.mtime = 1_000_000
+
+    def publish(self, manifest):
+        """Write the manifest with a fresh mtime so the registry picks it up"""
+        for version, entry in manifest['versions'].items():
+            with open(os.path.join(self.model_path, entry['file']), 'w') as weights:
+                weights.write(version)
+        write_manifest(manifest)
+        self.mtime += 1
+        os.utime(os.path.join(self.model_path, 'registry.json'), (self.mtime, self.mtime))
+        return manifest
+
+    def acquire(self, task_id):
+        return self.registry.acquire(task_id, 'cpu')
+
+    def test_cold_candidate_first_also_loads_active(self):
+        manifest = self.publish(make_manifest('v1', 'v2', percent=10))
+
+        self.assertEqual(self.acquire(task_routed_to(manifest, 'v2')), ('model-v2', 'v2'))
+        self.assertIn('v1', self.registry.models)
+        self.assertEqual(self.acquire(task_routed_to(manifest, 'v1')), ('model-v1', 'v1'))
+
+    def test_warming_candidate_falls_back_to_active(self):
+        manifest = self.publish(make_manifest('v1'))
+        self.acquire(1)
+
+        self.loader.block('v2')
+        manifest = self.publish(make_manifest('v1', 'v2', percent=10))
+        self.assertEqual(self.acquire(task_routed_to(manifest, 'v2')), ('model-v1', 'v1'))
+
+        self.loader.release('v2')
+        wait_for_preloads()
+        self.assertEqual(self.acquire(task_routed_to(manifest, 'v2')), ('model-v2', 'v2'))
+
+    def test_activation_serves_previous_active_while_loading(self):
+        manifest = self.publish(make_manifest('v1', 'v2', percent=10))
+        self.acquire(task_routed_to(manifest, 'v2'))
+
+        self.loader.block('v3')
+        manifest = self.publish(make_manifest('v3', 'v2', percent=10))
+        for task_id in range(1, 50):
+            model, version = self.acquire(task_id)
+            if route_version(manifest, task_id) == 'v2':
+                self.assertEqual(version, 'v2')
+            else:
+                self.assertEqual((model, version), ('model-v1', 'v1'))
+
+        self.loader.release('v3')
+        wait_for_preloads()
+        self.assertEqual(self.acquire(task_routed_to(manifest, 'v3')), ('model-v3', 'v3'))
+        self.assertNotIn('v1', self.registry.models)
+
+    def test_failed_candidate_falls_back_to_active(self):
+        manifest = self.publish(make_manifest('v1', 'v2', percent=10, broken={'v2'}))
+        candidate_task = task_routed_to(manifest, 'v2')
+
+        self.assertEqual(self.acquire(candidate_task), ('model-v1', 'v1'))
+        self.assertIn('v2', self.registry.failed)
+        self.assertEqual(self.acquire(candidate_task), ('model-v1', 'v1'))
+        self.assertEqual(self.loader.loaded, ['v1'])
+
+    def test_failed_activation_keeps_previous_active(self):
+        self.publish(make_manifest('v1'))
+        self.acquire(1)
+
+        self.publish(make_manifest('v3', broken={'v3'}))
+        self.acquire(1)
+        wait_for_preloads()
+        self.assertIn('v3', self.registry.failed)
+        self.assertEqual(self.acquire(1), ('model-v1', 'v1'))
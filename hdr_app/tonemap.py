@@ -0,0 +1,161 @@
+# hdr_app/tonemap.py
+import math
+import cv2
+import numpy as np
+from django.conf import settings
+
+TONE_MAP_OPERATORS = ['reinhard', 'mantiuk', 'drago']
+
+# Gamma used to linearise 8-bit sRGB input before tone mapping
+SRGB_GAMMA = 2.2
+
+# Lookup table from 8-bit values to linear radiance, applied with cv2.LUT
+# instead of a per-pixel power() over the full-resolution image
+_RADIANCE_LUT = np.power(np.arange(256, dtype=np.float32) / 255.0, SRGB_GAMMA).astype(np.float32)
+
+# Full-resolution rows processed at once when applying a gain map
+GAIN_STRIP_ROWS = 256
+
+
+def _to_radiance(image_bgr):
+    """Approximate linear radiance from an 8-bit BGR image"""
+    return cv2.LUT(image_bgr, _RADIANCE_LUT)
+
+
+def _to_uint8(image):
+    """Clip a float image in [0, 1] and convert it to 8-bit"""
+    np.clip(image, 0.0, 1.0, out=image)
+    return cv2.convertScaleAbs(image, alpha=255.0)
+
+
+def _create_tonemap(operator):
+    """Build the OpenCV tone mapping operator by name"""
+    if operator == 'reinhard':
+        return cv2.createTonemapReinhard(gamma=SRGB_GAMMA, intensity=0.0,
+                                         light_adapt=0.8, color_adapt=0.0)
+    if operator == 'mantiuk':
+        return cv2.createTonemapMantiuk(gamma=SRGB_GAMMA, scale=0.85, saturation=1.2)
+    if operator == 'drago':
+        return cv2.createTonemapDrago(gamma=SRGB_GAMMA, saturation=1.0, bias=0.85)
+    raise ValueError(f"Unknown tone mapping operator: {operator}")
+
+
+def _downscale_factor(image, max_pixels):
+    """Smallest integer factor that brings an image down to max_pixels"""
+    height, width = image.shape[:2]
+    return max(1, math.ceil(math.sqrt(height * width / max_pixels)))
+
+
+def _downscale(image, factor):
+    """Box-filter downscale by an integer factor, OpenCV's fast INTER_AREA path"""
+    return cv2.resize(image, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+
+
+def _gain_map(source, result):
+    """
+    Per-pixel, per-channel ratio of a float result in [0, 1] to its 8-bit
+    source, both at working resolution
+    """
+    return cv2.divide(result, source.astype(np.float32) + 1.0, scale=255.0)
+
+
+def _apply_gain(images, gain, factor):
+    """
+    Upsample a working-resolution gain map and apply it to the average of
+    full-resolution 8-bit images, a strip of rows at a time so no
+    full-resolution float buffer is ever allocated
+    """
+    height, width = images[0].shape[:2]
+    gain = gain / len(images)
+    result = np.empty_like(images[0])
+
+    for top in range(0, height, GAIN_STRIP_ROWS):
+        bottom = min(height, top + GAIN_STRIP_ROWS)
+        # Centre of each factor x factor block the gain was computed from
+        transform = np.float32([
+            [1 / factor, 0, 0.5 / factor - 0.5],
+            [0, 1 / factor, (top + 0.5) / factor - 0.5],
+        ])
+        strip_gain = cv2.warpAffine(gain, transform, (width, bottom - top),
+                                    flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                                    borderMode=cv2.BORDER_REPLICATE)
+        strip = images[0][top:bottom]
+        if len(images) > 1:
+            strip = strip.astype(np.float32)
+            for image in images[1:]:
+                cv2.add(strip, image[top:bottom], dst=strip, dtype=cv2.CV_32F)
+        result[top:bottom] = cv2.multiply(strip, strip_gain, dtype=cv2.CV_8U)
+    return result
+
+
+def tone_map_image(image_bgr, operator='reinhard', max_pixels=None):
+    """
+    Tone map a single 8-bit BGR image. Images above max_pixels (default
+    HDR_FAST_WORKING_PIXELS) are tone mapped at that size and the result
+    is carried back to full resolution as a gain map.
+    """
+    tonemap = _create_tonemap(operator)
+    factor = _downscale_factor(image_bgr, max_pixels or settings.HDR_FAST_WORKING_PIXELS)
+    if factor == 1:
+        return _to_uint8(tonemap.process(_to_radiance(image_bgr)))
+
+    small = _downscale(image_bgr, factor)
+    mapped = tonemap.process(_to_radiance(small))
+    return _apply_gain([image_bgr], _gain_map(small, mapped), factor)
+
+
+def _align(images, max_pixels):
+    """
+    Shift hand-held brackets onto the first frame. Shifts are estimated
+    with median threshold bitmaps on a full-resolution centre crop of at
+    most max_pixels, so they keep full-resolution precision.
+    """
+    height, width = images[0].shape[:2]
+    scale = min(1.0, (max_pixels / (height * width)) ** 0.5)
+    crop_height, crop_width = round(height * scale), round(width * scale)
+    top, left = (height - crop_height) // 2, (width - crop_width) // 2
+
+    def centre(image):
+        crop = image[top:top + crop_height, left:left + crop_width]
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+
+    # Each pyramid level halves the crop; keep the coarsest one meaningful
+    max_bits = min(6, max(1, int(math.log2(min(crop_height, crop_width) / 16))))
+    align = cv2.createAlignMTB(max_bits=max_bits)
+    reference = centre(images[0])
+    aligned = [images[0]]
+    for image in images[1:]:
+        shift = align.calculateShift(reference, centre(image))
+        aligned.append(align.shiftMat(image, shift) if any(shift) else image)
+    return aligned
+
+
+def fuse_exposures(images_bgr, max_pixels=None):
+    """
+    Merge bracketed 8-bit BGR exposures with Mertens exposure fusion.
+    Fusion runs at HDR_FAST_WORKING_PIXELS and is carried back to full
+    resolution as a gain map over the average of the aligned frames.
+    """
+    if len(images_bgr) < 2:
+        raise ValueError("Exposure fusion requires at least two images")
+
+    shape = images_bgr[0].shape[:2]
+    if any(image.shape[:2] != shape for image in images_bgr[1:]):
+        raise ValueError("Bracketed images must all have the same dimensions")
+
+    max_pixels = max_pixels or settings.HDR_FAST_WORKING_PIXELS
+
+    # Compensate for small camera shake between hand-held brackets
+    aligned = _align(images_bgr, max_pixels)
+
+    factor = _downscale_factor(aligned[0], max_pixels)
+    if factor == 1:
+        return _to_uint8(cv2.createMergeMertens().process(aligned))
+
+    small = [_downscale(image, factor) for image in aligned]
+    fused = cv2.createMergeMertens().process(small)
+    average = small[0].astype(np.float32)
+    for image in small[1:]:
+        cv2.add(average, image, dst=average, dtype=cv2.CV_32F)
+    average /= len(small)
+    return _apply_gain(aligned, _gain_map(average, fused), factor)
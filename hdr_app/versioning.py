@@ -0,0 +1,26 @@
+# hdr_app/versioning.py
+import uuid
+from django.core.cache import cache
+
+
+def tasks_version_key(user_id):
+    return f"hdr_tasks_version:{user_id}"
+
+
+def get_tasks_version(user_id):
+    """
+    Current version stamp of a user's task list. Stamps are random tokens
+    rather than counters, so a stamp lost from the cache can never be
+    reissued for different data.
+    """
+    key = tasks_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_tasks_version(user_id):
+    """Invalidate every status/history ETag handed out for this user"""
+    cache.set(tasks_version_key(user_id), uuid.uuid4().hex, None)
@@ -1,4 +1,5 @@
 # hdr_app/views.py
+import math
 import os
 import uuid
 from django.shortcuts import render, get_object_or_404
@@ -14,55 +15,125 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.utils import timezone
-from .models import HDREnhancementTask, UserProfile
+from django.db.models import F
+from .models import HDREnhancementTask, UserProfile, ENHANCEMENT_MODE_CHOICES, TONE_MAP_OPERATOR_CHOICES
 from .tasks import process_hdr_enhancement
+from .preflight import display_size, inspect_image, PreflightError
+from .renderers import etag_matches, json_response, not_modified
+from .versioning import get_tasks_version
 import json
 
+def interrupt_task(celery_task_id):
+    """
+    Revoke a queued task and interrupt a running one with SIGUSR1, which the
+    worker raises as SoftTimeLimitExceeded and handles as superseded. Unlike
+    SIGTERM this keeps the pool process and its loaded models alive.
+    """
+    from celery import current_app
+    current_app.control.revoke(celery_task_id, terminate=True, signal='SIGUSR1')
+
 class HDRUploadView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
         """Upload image for HDR enhancement"""
         try:
-            if 'image' not in request.FILES:
+            # A single 'image', or several 'images' for a bracketed exposure set
+            image_files = request.FILES.getlist('images') or request.FILES.getlist('image')
+            if not image_files:
                 return Response({'error': 'No image provided'}, 
                               status=status.HTTP_400_BAD_REQUEST)
+            if len(image_files) > settings.HDR_MAX_BRACKET_IMAGES:
+                return Response({'error': f"At most {settings.HDR_MAX_BRACKET_IMAGES} images per bracketed upload"}, 
+                              status=status.HTTP_400_BAD_REQUEST)
             
-            image_file = request.FILES['image']
+            # Validate the real format and size from the image headers,
+            # not the client-supplied content type
+            try:
+                image_metadata = [inspect_image(image_file) for image_file in image_files]
+            except PreflightError as e:
+                return Response({'error': str(e)}, 
+                              status=status.HTTP_400_BAD_REQUEST)
             
-            # Validate file type
-            allowed_types = ['image/jpeg', 'image/png', 'image/tiff']
-            if image_file.content_type not in allowed_types:
-                return Response({'error': 'Invalid file type. Only JPEG, PNG, and TIFF are allowed.'}, 
+            # Exposure fusion needs every bracketed frame at the same size
+            frame_size = display_size(image_metadata[0])
+            if any(display_size(metadata) != frame_size for metadata in image_metadata[1:]):
+                return Response({'error': 'Bracketed images must all have the same dimensions'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
-            # Generate unique filename
-            file_extension = os.path.splitext(image_file.name)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
+            # Enhancement options default to the user's profile preferences
+            profile, created = UserProfile.objects.get_or_create(user=request.user)
+            enhancement_mode = request.data.get('mode', profile.preferred_enhancement_mode)
+            tone_map_operator = request.data.get('operator', profile.preferred_tone_map_operator)
             
-            # Save file
-            file_path = default_storage.save(
-                f"uploads/{unique_filename}", 
-                ContentFile(image_file.read())
-            )
+            if enhancement_mode not in dict(ENHANCEMENT_MODE_CHOICES):
+                return Response({'error': 'Invalid enhancement mode'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            if tone_map_operator not in dict(TONE_MAP_OPERATOR_CHOICES):
+                return Response({'error': 'Invalid tone mapping operator'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            # Sampling schedule: explicit steps and/or a latency budget in seconds;
+            # interactive uploads default to the interactive budget
+            sampling_steps = request.data.get('steps')
+            latency_budget = request.data.get('latency_budget')
+            try:
+                sampling_steps = int(sampling_steps) if sampling_steps else None
+            except (TypeError, ValueError):
+                sampling_steps = 0
+            if sampling_steps is not None and sampling_steps < 1:
+                return Response({'error': 'Invalid number of steps'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            try:
+                latency_budget = float(latency_budget) if latency_budget else None
+            except (TypeError, ValueError):
+                latency_budget = float('nan')
+            if latency_budget is not None and not (math.isfinite(latency_budget) and latency_budget > 0):
+                return Response({'error': 'Invalid latency budget'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            if latency_budget is None and request.data.get('priority') == 'interactive':
+                latency_budget = settings.HDR_INTERACTIVE_LATENCY_BUDGET
+            
+            # Bracketed uploads are merged with exposure fusion
+            if len(image_files) > 1:
+                enhancement_mode = 'fast'
+            
+            # Save files under unique filenames
+            file_paths = []
+            for image_file in image_files:
+                file_extension = os.path.splitext(image_file.name)[1]
+                unique_filename = f"{uuid.uuid4()}{file_extension}"
+                file_paths.append(default_storage.save(
+                    f"uploads/{unique_filename}", 
+                    ContentFile(image_file.read())
+                ))
             
             # Create task record
             task = HDREnhancementTask.objects.create(
                 user=request.user,
-                original_filename=image_file.name,
-                file_path=file_path,
-                status='pending'
+                original_filename=image_files[0].name,
+                file_path=file_paths[0],
+                bracket_paths=file_paths[1:],
+                enhancement_mode=enhancement_mode,
+                tone_map_operator=tone_map_operator,
+                sampling_steps=sampling_steps,
+                latency_budget=latency_budget,
+                status='pending',
+                file_size_original=image_files[0].size,
+                **image_metadata[0]
             )
             
             # Queue the HDR enhancement task
             job = process_hdr_enhancement.delay(task.id)
             task.celery_task_id = job.id
-            task.save()
+            # Only this field: the worker may already be updating the task
+            task.save(update_fields=['celery_task_id'])
             
             return Response({
                 'task_id': task.id,
                 'celery_task_id': job.id,
                 'status': 'pending',
+                'mode': task.enhancement_mode,
                 'message': 'Image uploaded successfully. Processing started.'
             }, status=status.HTTP_201_CREATED)
             
@@ -76,18 +147,23 @@ class HDRStatusView(APIView):
     def get(self, request, task_id):
         """Get status of HDR enhancement task"""
         try:
-            task = get_object_or_404(HDREnhancementTask, id=task_id, user=request.user)
+            # Unchanged since the client's last poll: answer without querying tasks
+            etag = f'"{get_tasks_version(request.user.id)}-{task_id}"'
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
+            task = HDREnhancementTask.objects.filter(id=task_id, user=request.user).values(
+                'status', 'progress', 'original_filename', 'result_path', 'preview_path',
+                'preview_accepted', 'steps_used', 'model_version', 'image_format',
+                'image_width', 'image_height', 'error_message', 'created_at', 'updated_at',
+                task_id=F('id'), mode=F('enhancement_mode'),
+            ).first()
+            if task is None:
+                return Response({'error': 'Task not found'}, 
+                              status=status.HTTP_404_NOT_FOUND)
+            task['has_preview'] = bool(task['preview_path'])
             
-            return Response({
-                'task_id': task.id,
-                'status': task.status,
-                'progress': task.progress,
-                'original_filename': task.original_filename,
-                'result_path': task.result_path,
-                'error_message': task.error_message,
-                'created_at': task.created_at,
-                'updated_at': task.updated_at
-            })
+            return json_response(task, etag=etag)
             
         except Exception as e:
             return Response({'error': str(e)}, 
@@ -97,19 +173,28 @@ class HDRResultView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, task_id):
-        """Download HDR enhanced result"""
+        """Download HDR enhanced result, or its preview with ?variant=preview"""
         try:
             task = get_object_or_404(HDREnhancementTask, id=task_id, user=request.user)
             
-            if task.status != 'completed' or not task.result_path:
-                return Response({'error': 'Task not completed or no result available'}, 
-                              status=status.HTTP_404_NOT_FOUND)
+            if request.query_params.get('variant') == 'preview':
+                if not task.has_preview:
+                    return Response({'error': 'No preview available'}, 
+                                  status=status.HTTP_404_NOT_FOUND)
+                file_path = task.preview_path
+                download_name = f"hdr_preview_{task.original_filename}"
+            else:
+                if task.status != 'completed' or not task.result_path:
+                    return Response({'error': 'Task not completed or no result available'}, 
+                                  status=status.HTTP_404_NOT_FOUND)
+                file_path = task.result_path
+                download_name = f"hdr_enhanced_{task.original_filename}"
             
             # Serve the file
-            if default_storage.exists(task.result_path):
-                file_content = default_storage.open(task.result_path).read()
+            if default_storage.exists(file_path):
+                file_content = default_storage.open(file_path).read()
                 response = HttpResponse(file_content, content_type='image/jpeg')
-                response['Content-Disposition'] = f'attachment; filename="hdr_enhanced_{task.original_filename}"'
+                response['Content-Disposition'] = f'attachment; filename="{download_name}"'
                 return response
             else:
                 return Response({'error': 'Result file not found'}, 
@@ -119,29 +204,61 @@ class HDRResultView(APIView):
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class HDRAcceptPreviewView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, task_id):
+        """Accept the preview as the final result and stop refinement"""
+        try:
+            task = get_object_or_404(HDREnhancementTask, id=task_id, user=request.user)
+            
+            if task.status != 'processing' or not task.has_preview:
+                return Response({'error': 'No preview available to accept'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            
+            # Only the first of this view and the worker to finish the task wins
+            if not HDREnhancementTask.finish(task.id, task.user_id, 'completed',
+                                             result_path=task.preview_path,
+                                             preview_accepted=True,
+                                             progress=100):
+                return Response({'error': 'Task already finished'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            UserProfile.record_outcome(task.user_id, succeeded=True)
+            
+            # Stop refining now rather than after the full diffusion run
+            if task.celery_task_id:
+                interrupt_task(task.celery_task_id)
+            
+            return Response({'success': True, 'message': 'Preview accepted as result'})
+            
+        except Exception as e:
+            return Response({'error': str(e)}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class HDRHistoryView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
         """Get user's HDR enhancement history"""
         try:
-            tasks = HDREnhancementTask.objects.filter(user=request.user).order_by('-created_at')
-            
-            task_data = []
-            for task in tasks:
-                task_data.append({
-                    'id': task.id,
-                    'original_filename': task.original_filename,
-                    'status': task.status,
-                    'progress': task.progress,
-                    'created_at': task.created_at,
-                    'updated_at': task.updated_at
-                })
+            # Unchanged since the client's last poll: answer without querying tasks
+            etag = f'"{get_tasks_version(request.user.id)}-history"'
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            
+            task_data = list(
+                HDREnhancementTask.objects.filter(user=request.user).order_by('-created_at').values(
+                    'id', 'original_filename', 'status', 'progress', 'preview_path',
+                    'image_format', 'image_width', 'image_height', 'created_at', 'updated_at',
+                )
+            )
+            for task in task_data:
+                task['has_preview'] = bool(task.pop('preview_path'))
             
-            return Response({
+            return json_response({
                 'tasks': task_data,
                 'total': len(task_data)
-            })
+            }, etag=etag)
             
         except Exception as e:
             return Response({'error': str(e)}, 
@@ -192,15 +309,15 @@ class HDRCancelView(APIView):
                 return Response({'error': 'Task cannot be cancelled'}, 
                               status=status.HTTP_400_BAD_REQUEST)
             
+            # Only cancel if the worker has not finished the task meanwhile
+            if not HDREnhancementTask.finish(task.id, task.user_id, 'cancelled',
+                                             error_message='Task cancelled by user'):
+                return Response({'error': 'Task cannot be cancelled'}, 
+                              status=status.HTTP_400_BAD_REQUEST)
+            
             # Cancel Celery task if it exists
             if task.celery_task_id:
-                from celery import current_app
-                current_app.control.revoke(task.celery_task_id, terminate=True)
-            
-            # Update task status
-            task.status = 'cancelled'
-            task.error_message = 'Task cancelled by user'
-            task.save()
+                interrupt_task(task.celery_task_id)
             
             return Response({'success': True, 'message': 'Task cancelled successfully'})
             
@@ -263,6 +380,8 @@ class UserProfileView(APIView):
                     'monthly_limit': profile.monthly_limit,
                     'preferred_output_format': profile.preferred_output_format,
                     'preferred_quality': profile.preferred_quality,
+                    'preferred_enhancement_mode': profile.preferred_enhancement_mode,
+                    'preferred_tone_map_operator': profile.preferred_tone_map_operator,
                 },
                 'statistics': {
                     'total_processed': profile.total_processed,
@@ -297,7 +416,17 @@ class UserProfileView(APIView):
                 if 1 <= quality <= 100:
                     profile.preferred_quality = quality
             
-            profile.save()
+            if request.data.get('preferred_enhancement_mode') in dict(ENHANCEMENT_MODE_CHOICES):
+                profile.preferred_enhancement_mode = request.data['preferred_enhancement_mode']
+            
+            if request.data.get('preferred_tone_map_operator') in dict(TONE_MAP_OPERATOR_CHOICES):
+                profile.preferred_tone_map_operator = request.data['preferred_tone_map_operator']
+            
+            # Preferences only: the statistics are incremented concurrently by workers
+            profile.save(update_fields=[
+                'preferred_output_format', 'preferred_quality',
+                'preferred_enhancement_mode', 'preferred_tone_map_operator', 'updated_at',
+            ])
             
             return Response({'success': True, 'message': 'Profile updated successfully'})
             
@@ -142,6 +142,18 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Recycle a worker child once its resident memory passes this limit, in KiB
+# (instead of after a fixed number of tasks)
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = config('CELERY_WORKER_MAX_MEMORY_PER_CHILD', default=4 * 1024 * 1024, cast=int)
+
+# Cache (shared by web and worker processes for task list version stamps)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default=config('REDIS_URL', default='redis://localhost:6379/0')),
+        'KEY_PREFIX': 'hdr',
+    }
+}
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
@@ -166,11 +178,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # HDR Model Configuration
 HDR_MODEL_PATH = os.path.join(BASE_DIR, 'models')
 HDR_MODEL_WEIGHTS = os.path.join(HDR_MODEL_PATH, 'diffhdr_weights.pth')
+HDR_PREVIEW_MAX_SIZE = config('HDR_PREVIEW_MAX_SIZE', default=512, cast=int)  # Longest preview edge in pixels
+HDR_FAST_WORKING_PIXELS = config('HDR_FAST_WORKING_PIXELS', default=500_000, cast=int)  # Fast-mode operators run at this size, applied to full resolution as a gain map
+HDR_MAX_BRACKET_IMAGES = config('HDR_MAX_BRACKET_IMAGES', default=5, cast=int)  # Frames per bracketed upload
+
+# Diffusion sampling schedule
+HDR_DIFFUSION_TRAIN_STEPS = config('HDR_DIFFUSION_TRAIN_STEPS', default=1000, cast=int)  # Timesteps the model was trained with
+HDR_DIFFUSION_STEPS = config('HDR_DIFFUSION_STEPS', default=50, cast=int)  # Full-quality sampling steps
+HDR_DIFFUSION_MIN_STEPS = config('HDR_DIFFUSION_MIN_STEPS', default=10, cast=int)  # Floor when fitting a latency budget
+HDR_DIFFUSION_STEP_COST = config('HDR_DIFFUSION_STEP_COST', default=0.5, cast=float)  # Seconds per step assumed until one is measured (0 to disable)
+HDR_INTERACTIVE_LATENCY_BUDGET = config('HDR_INTERACTIVE_LATENCY_BUDGET', default=10.0, cast=float)  # Seconds of sampling for interactive uploads
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024
 
+# Upload pre-flight limits, checked from the image header
+HDR_MAX_IMAGE_DIMENSION = config('HDR_MAX_IMAGE_DIMENSION', default=12000, cast=int)  # Longest side in pixels
+HDR_MAX_IMAGE_PIXELS = config('HDR_MAX_IMAGE_PIXELS', default=64_000_000, cast=int)
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -0,0 +1,69 @@
+# hdr_project/settings_loadtest.py
+# Self-contained settings for the offline load-test harness:
+#   python manage.py hdr_loadtest --settings=hdr_project.settings_loadtest
+import tempfile
+from .settings import *  # noqa: F401,F403
+
+HDR_LOADTEST = True
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+# Scratch directory for the database and uploaded/result files
+LOADTEST_DIR = config('LOADTEST_DIR', default=os.path.join(tempfile.gettempdir(), 'hdr_loadtest'))
+os.makedirs(LOADTEST_DIR, exist_ok=True)
+
+# SQLite by default; point LOADTEST_DATABASE_URL at a local Postgres to compare
+DATABASES = {
+    'default': dj_database_url.parse(
+        config('LOADTEST_DATABASE_URL',
+               default=f"sqlite:///{os.path.join(LOADTEST_DIR, 'db.sqlite3')}")
+    )
+}
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Concurrent writers wait for the lock instead of failing immediately
+    DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+
+# Build tables straight from the models, without migration files
+MIGRATION_MODULES = {'hdr_app': None}
+
+# Local users only, no LDAP server
+AUTHENTICATION_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# In-process broker by default; set LOADTEST_BROKER_URL for a local Redis
+CELERY_BROKER_URL = config('LOADTEST_BROKER_URL', default='memory://')
+CELERY_RESULT_BACKEND = 'cache+memory://'
+
+# File cache by default, shared by all gunicorn workers so ETag version
+# stamps agree between them; set LOADTEST_CACHE_URL for a local Redis
+if config('LOADTEST_CACHE_URL', default=''):
+    CACHES['default']['LOCATION'] = config('LOADTEST_CACHE_URL')
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(LOADTEST_DIR, 'cache'),
+        }
+    }
+
+MEDIA_ROOT = os.path.join(LOADTEST_DIR, 'media')
+
+# Count database queries per request (X-DB-Queries response header)
+MIDDLEWARE = ['hdr_app.middleware.QueryCountMiddleware'] + MIDDLEWARE
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'level': 'WARNING',
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
+}